@@ -1,6 +1,8 @@
 import boto3
-import time
 import json
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import WaiterError
 
 # ---------- CONFIGURATION ----------
 REGION = "us-west-2"
@@ -12,7 +14,14 @@ ENDPOINT_NAME = "llama-nim-endpoint"
 INSTANCE_TYPE = "ml.g5.2xlarge"  # Adjust if using different GPU
 # ----------------------------------
 
-sagemaker = boto3.client("sagemaker", region_name=REGION)
+# Shared clients: botocore pools connections per client, so reuse them across calls
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+    tcp_keepalive=True,
+)
+sagemaker = boto3.client("sagemaker", region_name=REGION, config=BOTO_CONFIG)
+sagemaker_runtime = boto3.client("sagemaker-runtime", region_name=REGION, config=BOTO_CONFIG)
 
 
 def create_model():
@@ -71,34 +80,55 @@ def create_endpoint():
     wait_for_endpoint(ENDPOINT_NAME)
 
 
-def wait_for_endpoint(endpoint_name):
+def wait_for_endpoint(endpoint_name, max_checks=40):
     print("⏳ Waiting for endpoint to reach 'InService' status...")
-    sm_runtime = boto3.client("sagemaker", region_name=REGION)
-    while True:
-        response = sm_runtime.describe_endpoint(EndpointName=endpoint_name)
-        status = response["EndpointStatus"]
-        print(f"   Status: {status}")
-        if status in ["InService", "Failed"]:
+    # Built-in waiter stops early once the endpoint fails. Each chunk is 4 polls
+    # 30s apart (~90s, the waiter doesn't sleep after the last poll), so progress is
+    # printed between chunks; 40 chunks gives up after about an hour.
+    waiter = sagemaker.get_waiter("endpoint_in_service")
+    for _ in range(max_checks):
+        try:
+            waiter.wait(EndpointName=endpoint_name, WaiterConfig={"Delay": 30, "MaxAttempts": 4})
+            status = "InService"
             break
-        time.sleep(60)
+        except WaiterError:
+            status = sagemaker.describe_endpoint(EndpointName=endpoint_name)["EndpointStatus"]
+            print(f"   Status: {status}")
+            if status == "Failed":
+                break
 
     if status == "InService":
         print(f"✅ Endpoint is live! Name: {endpoint_name}")
-    else:
+    elif status == "Failed":
         print(f"❌ Deployment failed. Check CloudWatch logs for details.")
+    else:
+        print(f"⌛ Gave up waiting; endpoint is still '{status}'. Check the SageMaker console.")
 
 
-def test_inference():
-    print("🧪 Testing inference...")
-    runtime = boto3.client("sagemaker-runtime", region_name=REGION)
-    prompt = {"input": "Explain the difference between cloud and edge computing."}
-
-    response = runtime.invoke_endpoint(
+def invoke(prompt):
+    response = sagemaker_runtime.invoke_endpoint(
         EndpointName=ENDPOINT_NAME,
         ContentType="application/json",
-        Body=json.dumps(prompt)
+        Body=json.dumps({"input": prompt})
     )
-    print("Model response:\n", response["Body"].read().decode("utf-8"))
+    return response["Body"].read().decode("utf-8")
+
+
+def predict_batch(prompts, max_workers=8):
+    # Keep several requests in flight so the NIM's continuous batching can
+    # run them in the same forward passes instead of one at a time
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(invoke, prompts))
+
+
+def test_inference():
+    print("🧪 Testing inference...")
+    prompts = [
+        "Explain the difference between cloud and edge computing.",
+        "Suggest three products often bought together with coffee.",
+    ]
+    for prompt, response in zip(prompts, predict_batch(prompts)):
+        print(f"Prompt: {prompt}\nModel response:\n", response)
 
 
 if __name__ == "__main__":
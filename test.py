@@ -10,16 +10,20 @@ import json
 import requests
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # URLs of your running services
 VECTOR_DB_URL = "http://localhost:8001"
 RETRIEVAL_NIM_URL = "http://localhost:8002/v1/embeddings"
 
+# Shared session so repeated calls reuse keep-alive connections
+http = requests.Session()
+
 
 # ✅ Upload JSON file to seed the Vector DB
 print("Seeding vector DB from file...")
 with open("data/test_seed.json", "rb") as f:
-    res = requests.post(f"{VECTOR_DB_URL}/seed_from_file", files={"file": f})
+    res = http.post(f"{VECTOR_DB_URL}/seed_from_file", files={"file": f})
     if res.status_code == 200:
         print("Seeded vector DB.\n")
     else:
@@ -40,52 +44,67 @@ print(f"User purchase history for {first_user}: {user_purchase_history}\n")
 print("User purchase history:", user_purchase_history, "\n")
 
 # 3️⃣ Step 6.1 & 6.2: Query Retrieval NIM for similar related products
-related_products = []
-
-for product in user_purchase_history:
-    # 1️⃣ Get embedding for the current product (query vector)
-    emb_resp = requests.post(
-        RETRIEVAL_NIM_URL,
-        json={
-            "model": "nvidia/nv-embedqa-e5-v5",
-            "input_type": "query",
-            "input": product
-        },
-    )
-
-    if emb_resp.status_code != 200:
-        print(f"Retrieval NIM error for {product}: {emb_resp.text}")
-        continue
-
-    # print(f"Response for {product}:\n", emb_resp.text)
-    # embedding = emb_resp.json()["embedding"][0]
-    embedding = emb_resp.json()["data"][0]["embedding"]
+# 1️⃣ Get embeddings for every purchased product (query vectors) in one NIM call
+emb_resp = http.post(
+    RETRIEVAL_NIM_URL,
+    json={
+        "model": "nvidia/nv-embedqa-e5-v5",
+        "input_type": "query",
+        "input": user_purchase_history
+    },
+)
+
+if emb_resp.status_code == 200:
+    # print("Retrieval NIM response:\n", emb_resp.text)
+    emb_data = sorted(emb_resp.json()["data"], key=lambda d: d["index"])
+    product_embeddings = list(zip(user_purchase_history, [d["embedding"] for d in emb_data]))
+else:
+    print(f"Retrieval NIM error for {user_purchase_history}: {emb_resp.text}")
+    product_embeddings = []
+
+
+# Each product is independent, so the Vector DB round trips run concurrently.
+def find_related(product_embedding):
+    product, embedding = product_embedding
 
     # 2️⃣ Query the Vector DB for similar items
-    db_resp = requests.post(
+    db_resp = http.post(
         f"{VECTOR_DB_URL}/query_embedding",
         json={"embedding": embedding, "n_results": 3}
     )
 
     if db_resp.status_code == 200:
         matches = db_resp.json().get("matches", [])
-        related_products.extend(matches)
         print(f"Related products for '{product}': {matches}")
         # print("Vector DB at least worked")
+        return matches
     else:
         print(f"Vector DB query error for {product}: {db_resp.text}")
+        return []
+
+
+related_products = []
+with ThreadPoolExecutor() as pool:
+    for matches in pool.map(find_related, product_embeddings):
+        related_products.extend(matches)
 
 print("\n Retrieval NIM returned all related products:", related_products, "\n")
 
 # 4️⃣ Step 7.1 & 7.2: Query Vector DB for any of those related products
-results = []
-for product in related_products:
-    resp = requests.post(f"{VECTOR_DB_URL}/query", json={"query": product, "n_results": 3})
+def query_vector_db(product):
+    resp = http.post(f"{VECTOR_DB_URL}/query", json={"query": product, "n_results": 3})
     if resp.status_code == 200:
         matches = resp.json().get("matches", [])
         if matches:
-            results.extend(matches)
             print(f" Vector DB found matches for '{product}': {matches}")
+        return matches
+    return []
+
+
+results = []
+with ThreadPoolExecutor() as pool:
+    for matches in pool.map(query_vector_db, related_products):
+        results.extend(matches)
 
 print("\n Final results (everything Vector DB returned):")
 for item in set(results):
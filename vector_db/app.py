@@ -1,15 +1,31 @@
+import asyncio
 import json
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 
 from pydantic import BaseModel
 import chromadb
 import numpy as np
 import requests
-from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import os
+import threading
+
+# Only this module's logger is set up: uvicorn configures just the uvicorn.* loggers,
+# and turning up the root logger would also surface every library's INFO output
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
 
 class VectorDBManager:
-    def __init__(self, collection_name="user_embeddings", embedding_dim=1024):
+    def __init__(self, collection_name="user_embeddings", embedding_dim=1024, nim_batch_size=32, nim_workers=4,
+                 embedding_cache_size=2048, nim_pool_size=32):
         # --- Ensure persistence directory exists ---
         storage_path = "./data/chromadb_storage"
         os.makedirs(storage_path, exist_ok=True)
@@ -18,6 +34,18 @@ class VectorDBManager:
         self.client = chromadb.PersistentClient(path=storage_path)
         # self.nim_url = "http://localhost:8002/v1/models/nv-embedqa-e5-v5/infer"  # Retrieval Embedding NIM endpoint
         self.nim_url = "http://localhost:8002/v1/embeddings"
+        # Set RETRIEVAL_NIM_ENABLED=false (or 0/no/off) to use mock embeddings without calling the NIM
+        self.nim_enabled = os.getenv("RETRIEVAL_NIM_ENABLED", "true").strip().lower() not in ("false", "0", "no", "off")
+        # Reuse one keep-alive connection to the NIM instead of reconnecting per request,
+        # retrying transient NIM errors (429/5xx) with backoff. Refused connections and
+        # read timeouts are not retried, so a NIM that is down or hung falls back to mock
+        # embeddings after at most one timeout. The pool is shared by every request
+        # thread plus the batch workers, so it is sized separately from nim_workers
+        self.session = requests.Session()
+        retries = Retry(total=3, connect=0, read=0, backoff_factor=0.2,
+                        status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["POST"])
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=nim_pool_size, max_retries=retries))
+        self.nim_timeout = 30
 
         
         # Create or retrieve collection
@@ -26,27 +54,121 @@ class VectorDBManager:
         # Embedding dimension (set according to your embedding model)
         self.embedding_dim = embedding_dim
 
+        # LRU of NIM embeddings by text, so repeat items (seeding, re-adding users) skip
+        # the NIM. Bounded because texts come from clients and each entry is ~32 KB
+        self.embedding_cache = OrderedDict()
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache_lock = threading.Lock()
+
+        # Max texts per NIM request; larger inputs are split into several requests
+        # that are sent concurrently by up to nim_workers threads
+        self.nim_batch_size = nim_batch_size
+        self.nim_workers = nim_workers
+
+        # Consecutive failed NIM calls; only the first of each outage is logged as a
+        # warning so seeding while the NIM is down doesn't spam one message per user
+        self.nim_failures = 0
+
     def generate_embedding(self, text: str):
-        try:
-            payload = {
-                "model": "nvidia/nv-embedqa-e5-v5",
-                "input": [text],
-                "input_type": "passage"
-            }
-            res = requests.post("http://localhost:8002/v1/embeddings", json=payload)
-            res.raise_for_status()
-            return res.json()["data"][0]["embedding"]
-        except Exception as e:
-            print(f"⚠️ Retrieval NIM unavailable, using mock embedding: {e}")
-            np.random.seed(abs(hash(text)) % (2**32))
-            return np.random.rand(self.embedding_dim).tolist()
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: list[str]):
+        """
+        Embeds texts with as few Retrieval NIM requests as possible (up to
+        nim_batch_size texts each). Texts already embedded are served from
+        the cache. Falls back to mock embeddings if the NIM is down.
+        """
+        if not self.nim_enabled:
+            return [self._mock_embedding(text) for text in texts]
+
+        # dict.fromkeys drops repeated texts so each one is embedded only once
+        found = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            cached = self._cache_get(text)
+            if cached is None:
+                missing.append(text)
+            else:
+                found[text] = cached
+
+        if missing:
+            # Group similar-length texts so each NIM batch pads as little as possible
+            missing.sort(key=len)
+            batches = [missing[start:start + self.nim_batch_size]
+                       for start in range(0, len(missing), self.nim_batch_size)]
+            try:
+                if len(batches) == 1:
+                    results = [self._request_embeddings(batches[0])]
+                else:
+                    with ThreadPoolExecutor(max_workers=self.nim_workers) as pool:
+                        results = list(pool.map(self._request_embeddings, batches))
+            except Exception as e:
+                self.nim_failures += 1
+                log = logger.warning if self.nim_failures == 1 else logger.debug
+                log(f"⚠️ Retrieval NIM unavailable, using mock embedding: {e}")
+                return [found.get(text) or self._mock_embedding(text) for text in texts]
+
+            self.nim_failures = 0
+            for result in results:
+                found.update(result)
+                for text, embedding in result.items():
+                    self._cache_put(text, embedding)
+        return [found[text] for text in texts]
+
+    def _request_embeddings(self, batch: list[str]):
+        payload = {
+            "model": "nvidia/nv-embedqa-e5-v5",
+            "input": batch,
+            "input_type": "passage"
+        }
+        res = self.session.post(self.nim_url, json=payload, timeout=self.nim_timeout)
+        res.raise_for_status()
+        data = sorted(res.json()["data"], key=lambda d: d["index"])
+        if len(data) != len(batch):
+            raise ValueError(f"NIM returned {len(data)} embeddings for {len(batch)} texts")
+        return {text: d["embedding"] for text, d in zip(batch, data)}
+
+    def _cache_get(self, text: str):
+        with self.embedding_cache_lock:
+            embedding = self.embedding_cache.get(text)
+            if embedding is not None:
+                self.embedding_cache.move_to_end(text)
+            return embedding
+
+    def _cache_put(self, text: str, embedding: list[float]):
+        with self.embedding_cache_lock:
+            self.embedding_cache[text] = embedding
+            self.embedding_cache.move_to_end(text)
+            while len(self.embedding_cache) > self.embedding_cache_size:
+                self.embedding_cache.popitem(last=False)
+
+    def warm_embedding_cache(self, top_k=500, scan_limit=10000):
+        """
+        Pre-embeds the most common items among the first scan_limit documents
+        stored in the collection so the first requests that mention them
+        don't wait on the NIM.
+        """
+        if not self.nim_enabled:
+            return
+
+        documents = self.collection.get(include=["documents"], limit=scan_limit)["documents"]
+        popular = [doc for doc, _ in Counter(documents).most_common(top_k)]
+        self.generate_embeddings(popular)
+        warmed = sum(doc in self.embedding_cache for doc in popular)
+        logger.info(f"Warmed embedding cache with {warmed}/{len(popular)} items")
+
+    def _mock_embedding(self, text: str):
+        # Per-text Generator rather than reseeding numpy's global RNG, which is
+        # shared state and races when requests run in the threadpool
+        rng = np.random.default_rng(abs(hash(text)) % (2**32))
+        return rng.random(self.embedding_dim).tolist()
 
 
 
     # Add user's purchase embeddings
     
     def add_user_embeddings(self, user_id: str, purchases: list[str]):
-        embeddings = [self.generate_embedding(item) for item in purchases]
+        embeddings = self.generate_embeddings(purchases)
         ids = [f"{user_id}_{i}" for i in range(len(purchases))]
         self.collection.add(
             ids=ids,
@@ -54,7 +176,7 @@ class VectorDBManager:
             documents=purchases,
             metadatas=[{"user_id": user_id} for _ in purchases],
         )
-        print(f"✅ Added {len(purchases)} items for {user_id}")
+        logger.info(f"✅ Added {len(purchases)} items for {user_id}")
         # self.client.persist()
 
     # TODO: Change this to become given a list of item vectors, check which item vectors exist inside the database for the given user
@@ -64,19 +186,23 @@ class VectorDBManager:
         to existing embeddings in the DB for the specified user.
         Returns a list of matches with similarity scores.
         """
-        results = []
-        for vec in item_vectors:
-            res = self.collection.query(
-                query_embeddings=[vec],
-                where={"user_id": user_id},
-                n_results=1  # find the closest stored item
-            )
+        if not item_vectors:
+            return []
+
+        # One query for all vectors instead of one round trip per vector
+        res = self.collection.query(
+            query_embeddings=item_vectors,
+            where={"user_id": user_id},
+            n_results=1  # find the closest stored item
+        )
 
-            if not res["documents"][0]:
+        results = []
+        for documents, distances in zip(res["documents"], res["distances"]):
+            if not documents:
                 continue
 
-            closest_item = res["documents"][0][0]
-            score = 1 - res["distances"][0][0]  # convert distance → similarity (approx)
+            closest_item = documents[0]
+            score = 1 - distances[0]  # convert distance → similarity (approx)
 
             if score >= similarity_threshold:
                 results.append({"item": closest_item, "similarity": score})
@@ -104,23 +230,40 @@ class VectorDBManager:
             if not isinstance(purchases, list):
                 raise ValueError(f"Purchases for user '{user_id}' must be a list.")
 
-            for item in purchases:
-                # Generate embedding for each item
-                embedding = self.generate_embedding(item)
+            # Ids are f"{user_id}_{item}", so repeat purchases would collide in one add
+            purchases = list(dict.fromkeys(purchases))
+            if not purchases:
+                continue
 
-                # Store in vector DB
-                self.collection.add(
-                    ids=[f"{user_id}_{item}"],
-                    documents=[item],
-                    embeddings=[embedding],
-                    metadatas=[{"user_id": user_id}]
-                )
+            # Embed all of the user's purchases in one NIM call
+            embeddings = self.generate_embeddings(purchases)
+
+            # Store in vector DB
+            self.collection.add(
+                ids=[f"{user_id}_{item}" for item in purchases],
+                documents=purchases,
+                embeddings=embeddings,
+                metadatas=[{"user_id": user_id} for _ in purchases]
+            )
 
 
 # ===============================
 # 🔹 FastAPI App
 # ===============================
-app = FastAPI(title="VectorDB Recommendation API")
+def _log_warmup_result(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Embedding cache warm-up failed", exc_info=future.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm in the background so the API is up before the NIM has answered
+    warmup = asyncio.get_running_loop().run_in_executor(None, db.warm_embedding_cache)
+    warmup.add_done_callback(_log_warmup_result)
+    yield
+
+
+app = FastAPI(title="VectorDB Recommendation API", lifespan=lifespan)
 db = VectorDBManager()
 
 
@@ -173,7 +316,8 @@ async def seed_from_file(file: UploadFile = File(...)):
         data = json.loads(contents)
         if not isinstance(data, dict):
             raise ValueError("JSON must be a dictionary of user_id: [purchases]")
-        db.seed_from_json(data)
+        # Seeding makes blocking NIM + Chroma calls; keep them off the event loop
+        await run_in_threadpool(db.seed_from_json, data)
         return {"message": "✅ Database seeded successfully", "users": list(data.keys())}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON file: {e}")
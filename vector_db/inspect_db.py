@@ -9,9 +9,11 @@ collection = client.get_or_create_collection(name="user_embeddings")
 # Fetch all stored items
 results = collection.get(include=["documents", "metadatas", "embeddings"])
 
-print("\n📦 Current contents of vector DB:")
+# Collect the report and print it once instead of one write per line
+lines = ["\n📦 Current contents of vector DB:"]
 for i, (doc, meta, id_) in enumerate(zip(results["documents"], results["metadatas"], results["ids"])):
-    print(f"{i+1}. ID: {id_}")
-    print(f"   📝 Document: {doc}")
-    print(f"   🧠 Metadata: {meta}")
-    print()
+    lines.append(f"{i+1}. ID: {id_}")
+    lines.append(f"   📝 Document: {doc}")
+    lines.append(f"   🧠 Metadata: {meta}")
+    lines.append("")
+print("\n".join(lines))